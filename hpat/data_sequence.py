@@ -1,45 +1,97 @@
-from collections import defaultdict
+import itertools
+from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from typing import Optional, List, Dict, Tuple, Set
 
-from hpat.match import Match
+from hpat.match import Match, concept_registry
 
 
-@dataclass
+_VERSION_COUNTER = itertools.count()
+
+
+def _get_version():
+    return next(_VERSION_COUNTER)
+
+
+_CHARACTER_ID = concept_registry.get_id('Character')
+# TODO: we need a better way of specifying concepts that can be duplicated
+_DUPLICABLE_CONCEPT_IDS = frozenset(
+    concept_registry.get_id(concept) for concept in ('Sentence', 'MakesSense'))
+
+
+@dataclass(slots=True)
 class DataElement:
     value: Optional[any] = None
     matches: List[Match] = field(default_factory=list)
     disabled: bool = False
+    # {(concept_id, size, start_idx): [match1, match2]}
+    _match_index: Dict[tuple, List[Match]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
 
-    def contains_match(self, match: Match) -> bool:
-        for saved in self.matches:
-            if saved.concept != match.concept:
-                continue
-            if saved.size != match.size:
-                continue
-            if saved.start_idx != match.start_idx:
-                continue
-            # TODO: we need a better way of specifying concepts that can be duplicated
-            if match.concept in {'Sentence', 'MakesSense'} and saved.depends_on_matches != match.depends_on_matches:
-                continue
+    def __post_init__(self):
+        for match in self.matches:
+            self._match_index.setdefault(self._get_match_key(match), []).append(match)
 
+    @staticmethod
+    def _get_match_key(match: Match) -> tuple:
+        return match.concept_id, match.size, match.start_idx
+
+    def contains_match(self, match: Match) -> bool:
+        saved_matches = self._match_index.get(self._get_match_key(match))
+        if not saved_matches:
+            return False
+        if match.concept_id not in _DUPLICABLE_CONCEPT_IDS:
             return True
+        for saved in saved_matches:
+            if saved.depends_on_matches == match.depends_on_matches:
+                return True
         return False
 
     def add_match(self, match: Match) -> bool:
         if not self.contains_match(match):
-            self.matches.append(match)
+            self.append_match(match)
             return True
         return False
 
+    def append_match(self, match: Match):
+        """ Adds match without checking whether it is already present"""
+        self.matches.append(match)
+        self._match_index.setdefault(self._get_match_key(match), []).append(match)
 
-@dataclass
+    def remove_matches(self, match_ids: Set[str]):
+        kept = []
+        for match in self.matches:
+            if match.id not in match_ids:
+                kept.append(match)
+                continue
+            key = self._get_match_key(match)
+            saved_matches = self._match_index[key]
+            saved_matches.remove(match)
+            if not saved_matches:
+                del self._match_index[key]
+        self.matches = kept
+
+
+@dataclass(slots=True)
 class DataSequence:
     value: str
     elements: List[DataElement]
-    extractions: Dict[str, List[str]] = field(default_factory=lambda: defaultdict(list))
+    extractions: Dict[str, List[str]] = field(default_factory=dict)
     consolidated: bool = False
     match_by_id: Dict[str, Match] = field(default_factory=dict)
+    # reverse of Match.depends_on_matches: {match_id: {dependant_match_id, }}
+    # ids of removed matches are kept only while their dependants are still present
+    dependents_by_id: Dict[str, Set[str]] = field(
+        default_factory=lambda: defaultdict(set), init=False, repr=False, compare=False)
+    # every match is listed once, in the order it was added
+    matches_by_start_idx: Dict[int, List[Match]] = field(
+        default_factory=lambda: defaultdict(list), init=False, repr=False, compare=False)
+    matches_by_concept: Dict[str, List[Match]] = field(
+        default_factory=lambda: defaultdict(list), init=False, repr=False, compare=False)
+    _all_match_ids: Set[str] = field(default_factory=set, init=False, repr=False, compare=False)
+    # changes whenever matches are added or removed,
+    # unique across sequences so that cached results can't be mixed up
+    version: int = field(default_factory=_get_version, init=False, repr=False, compare=False)
 
     @property
     def size(self):
@@ -48,8 +100,41 @@ class DataSequence:
     def __post_init__(self):
         for ele in self.elements:
             for match in ele.matches:
+                if match.id not in self._all_match_ids:
+                    self._index_match(match)
                 self.match_by_id[match.id] = match
 
+    def _index_match(self, match: Match):
+        self._all_match_ids.add(match.id)
+        for dependency_id in match.depends_on_matches:
+            self.dependents_by_id[dependency_id].add(match.id)
+        self.matches_by_start_idx[match.start_idx].append(match)
+        self.matches_by_concept[match.concept].append(match)
+
+    def _unindex_matches(self, matches: List[Match], match_ids: Set[str]):
+        start_idxs = set()
+        concepts = set()
+        for match in matches:
+            self._all_match_ids.discard(match.id)
+            for dependency_id in match.depends_on_matches:
+                dependants = self.dependents_by_id.get(dependency_id)
+                if dependants is None:
+                    continue
+                dependants.discard(match.id)
+                if not dependants:
+                    del self.dependents_by_id[dependency_id]
+            start_idxs.add(match.start_idx)
+            concepts.add(match.concept)
+
+        for index, keys in ((self.matches_by_start_idx, start_idxs),
+                            (self.matches_by_concept, concepts)):
+            for key in keys:
+                kept = [x for x in index[key] if x.id not in match_ids]
+                if kept:
+                    index[key] = kept
+                else:
+                    del index[key]
+
     def add_concept(self, concept, start_idx: int, size: int, weight: float = 1.0) -> bool:
         return self.add_match(Match(
             concept=concept,
@@ -66,56 +151,59 @@ class DataSequence:
         if not match.dependencies_present(self):
             return False
 
+        # a match is present in every element it covers,
+        # so it is enough to check the first one
+        if not match.size or self.elements[match.start_idx].contains_match(match):
+            return False
+
         self.consolidated = False
-        added_new_match = False
-        for idx in range(match.size):
-            added = self.elements[match.start_idx + idx].add_match(match)
-            added_new_match |= added
-            if added:
-                self.match_by_id[match.id] = match
-        return added_new_match
+        self.version = _get_version()
+        for idx in range(match.start_idx, match.end_idx):
+            self.elements[idx].append_match(match)
+        self.match_by_id[match.id] = match
+        self._index_match(match)
+        return True
 
     def revoke_match(self, match_id: str, cascade: bool = True):
         """ Removes match by its id and all matches that depend on it
         This may happen when an assumed match was invalidated.
         """
+        match_ids = {match_id, }
+        if cascade:
+            match_ids.update(self.get_dependant_matches(match_id))
+        self.remove_matches(match_ids)
+
+    def remove_matches(self, match_ids: Set[str]):
+        """ Removes matches by their ids in a single sweep, does not cascade"""
         self.consolidated = False
-        to_revoke = []
-        for node in self.elements:
-            to_remove = []
-            for match in node.matches:
-                if match_id in match.depends_on_matches:
-                    to_revoke.append(match.id)
-                elif match_id == match.id:
-                    to_remove.append(match)
+        self.version = _get_version()
+        matches = [self.match_by_id.pop(match_id) for match_id in match_ids
+                   if match_id in self.match_by_id]
 
-            for match in to_remove:
-                self.match_by_id.pop(match.id, None)
-                node.matches.remove(match)
+        self._unindex_matches(matches, match_ids)
 
-        if cascade:
-            for match_id in to_revoke:
-                self.revoke_match(match_id)
+        element_idxs = set()
+        for match in matches:
+            element_idxs.update(range(match.start_idx, match.end_idx))
+        for idx in element_idxs:
+            self.elements[idx].remove_matches(match_ids)
 
     def consolidate(self):
         """ Takes all matches and finds all extractions """
         if self.consolidated:
             return
 
-        self.extractions.clear()
+        extractions = {}
 
-        matches = []
-        match_ids = set()
-
-        for node in self.elements:
-            for match in node.matches:
-                if match.id not in match_ids:
-                    matches.append(match)
-                    match_ids.add(match.id)
+        # every match is listed once, ordered as they appear in the elements
+        for start_idx in sorted(self.matches_by_start_idx):
+            for match in self.matches_by_start_idx[start_idx]:
+                if not match.extractions:
+                    continue
+                for pattern_node_id, values in match.extractions.items():
+                    extractions.setdefault(pattern_node_id, []).extend(values)
 
-        for match in matches:
-            for pattern_node_id, values in match.extractions.items():
-                self.extractions[pattern_node_id].extend(values)
+        self.extractions = extractions
 
         self.consolidated = True
 
@@ -148,51 +236,49 @@ class DataSequence:
     def disable_elements(self, concepts):
         if isinstance(concepts, str):
             concepts = [concepts, ]
-        for elem in self.elements:
-            for match in elem.matches:
-                if match.concept in concepts:
-                    elem.disabled = True
-                    break
+        for concept in set(concepts):
+            for match in self.matches_by_concept.get(concept, ()):
+                for idx in range(match.start_idx, match.end_idx):
+                    self.elements[idx].disabled = True
 
     def find_dependant_matches(self, match_id):
-        result = []
-        for element in self.elements:
-            for match in element.matches:
-                if match_id in match.depends_on_matches:
-                    result.append(match.id)
-        return sorted(list(set(result)))
+        """ Returns ids of matches that directly depend on a given match"""
+        return sorted(self.dependents_by_id.get(match_id, ()))
 
     @classmethod
     def from_string(cls, text):
+        matches = [
+            Match(concept='Character', value=ch, size=1, start_idx=i)
+            for i, ch in enumerate(text)
+        ]
         return cls(
             value=text,
-            elements=[
-                DataElement(ch, [Match(concept='Character', value=ch, size=1, start_idx=i)])
-                for i, ch in enumerate(text)
-            ]
+            elements=[DataElement(match.value, [match, ]) for match in matches],
         )
 
     def get_all_match_ids(self) -> Set[str]:
-        match_ids = set()
-
-        for elem in self.elements:
-            for match in elem.matches:
-                match_ids.add(match.id)
-
-        return match_ids
+        """ Returns ids of all present matches,
+        the set is kept up to date by the sequence and must not be modified
+        """
+        return self._all_match_ids
 
     def get_match_importance(self, match_id: str) -> int:
         """ Returns number of dependant matches"""
         return len(self.get_dependant_matches(match_id))
 
-    def get_dependant_matches(self, match_id) -> Set[str]:
+    def get_dependant_matches(self, match_id: str) -> Set[str]:
+        """ Returns ids of all matches that depend on a given match, directly or not"""
+        return self._get_dependant_matches([match_id, ])
+
+    def _get_dependant_matches(self, match_ids) -> Set[str]:
         deps = set()
+        queue = deque(match_ids)
 
-        for elem in self.elements:
-            for match in elem.matches:
-                if match_id in match.depends_on_matches:
-                    deps.add(match.id)
-                    deps.update(self.get_dependant_matches(match_id.id))
+        while queue:
+            for dependant_id in self.dependents_by_id.get(queue.popleft(), ()):
+                if dependant_id not in deps:
+                    deps.add(dependant_id)
+                    queue.append(dependant_id)
 
         return deps
 
@@ -200,66 +286,64 @@ class DataSequence:
         """ Returns slots (positions) for a given concept,
         slot is a tuple of (start_idx, end_idx).
         """
+        match_ids = set()
+        for match_concept in self._find_concepts({concept, }, hierarchy):
+            match_ids.update(match.id for match in self.matches_by_concept[match_concept])
+
+        # keep the order matches have in the elements
         result = []
-        for idx, elem in enumerate(self.elements):
-            for match in elem.matches:
-                if match.start_idx != idx:
-                    continue
-                if hierarchy is None and match.concept != concept:
-                    continue
-                elif hierarchy is not None and concept not in hierarchy.get_parents(match.concept) \
-                        and match.concept != concept:
-                    continue
+        start_idxs = {self.match_by_id[match_id].start_idx for match_id in match_ids}
+        for idx in sorted(start_idxs):
+            for match in self.matches_by_start_idx[idx]:
+                if match.id in match_ids:
+                    result.append(match.slot)
 
-                result.append((match.start_idx, match.start_idx + match.size))
+        return result
 
+    def _find_concepts(self, concepts: Set[str], hierarchy=None) -> List[str]:
+        """ Returns concepts of present matches that are any of the given concepts
+        or their children when hierarchy is provided
+        """
+        result = []
+        for match_concept in self.matches_by_concept:
+            if match_concept in concepts:
+                result.append(match_concept)
+            elif hierarchy and not concepts.isdisjoint(hierarchy.get_parents(match_concept)):
+                result.append(match_concept)
         return result
 
     def clean_matches(self, main_match_id: str):
+        """ Removes matches inside the main match that it does not depend on
+        and all matches that depend on them. Characters are always kept.
+        """
         main_match = self.match_by_id[main_match_id]
-        matches_to_remove = self.get_all_match_ids() - set(main_match.get_all_dependencies(self))
-        matches_to_remove.remove(main_match.id)
-        start = main_match.start_idx
-        end = main_match.end_idx
-        for match_id in matches_to_remove:
-            if match_id not in self.match_by_id:
-                continue
-            match = self.match_by_id[match_id]
-            if not (match.start_idx >= start and match.end_idx <= end):
-                continue
-            if self.match_by_id[match_id].concept == 'Character':
-                continue
-            self.revoke_match(match_id)
+        matches_to_keep = set(main_match.get_all_dependencies(self))
+        matches_to_keep.add(main_match.id)
 
-    def keep_only(self, concepts: list[str], hierarchy=None):
         matches_to_remove = set()
-        for idx, elem in enumerate(self.elements):
-            for match in elem.matches:
-                if match.start_idx != idx:
+        for idx in range(main_match.start_idx, main_match.end_idx):
+            for match in self.matches_by_start_idx.get(idx, ()):
+                if match.end_idx > main_match.end_idx:
                     continue
-                if match.concept in concepts:
+                if match.id in matches_to_keep or match.concept_id == _CHARACTER_ID:
                     continue
-                if hierarchy:
-                    parents = hierarchy.get_parents(match.concept)
-                    if set(parents).intersection(set(concepts)):
-                        continue
                 matches_to_remove.add(match.id)
 
-        for match_id in matches_to_remove:
-            self.revoke_match(match_id, cascade=False)
+        matches_to_remove.update(self._get_dependant_matches(matches_to_remove))
+        self.remove_matches(matches_to_remove)
+
+    def keep_only(self, concepts: list[str], hierarchy=None):
+        to_keep = set(self._find_concepts(set(concepts), hierarchy))
+        matches_to_remove = set()
+        for concept, matches in self.matches_by_concept.items():
+            if concept not in to_keep:
+                matches_to_remove.update(match.id for match in matches)
+
+        self.remove_matches(matches_to_remove)
 
     def drop_matches(self, concepts: list[str], hierarchy=None, cascade=False):
         matches_to_remove = set()
-        for idx, elem in enumerate(self.elements):
-            for match in elem.matches:
-                if match.start_idx != idx:
-                    continue
-                if match.concept in concepts:
-                    matches_to_remove.add(match.id)
-                elif hierarchy:
-                    parents = hierarchy.get_parents(match.concept)
-                    if set(parents).intersection(set(concepts)):
-                        matches_to_remove.add(match.id)
-
-        for match_id in matches_to_remove:
-            self.revoke_match(match_id, cascade=False)
+        for concept in self._find_concepts(set(concepts), hierarchy):
+            matches_to_remove.update(match.id for match in self.matches_by_concept[concept])
+
+        self.remove_matches(matches_to_remove)
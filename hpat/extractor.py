@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Optional, List, Dict, FrozenSet, Set, Tuple
 
 from hpat.pattern import (
     Pattern,
@@ -12,34 +12,104 @@ from hpat.data_sequence import (
     DataSequence,
 )
 from hpat.match import (
+    Match,
     MatchState,
+    concept_registry,
 )
 
 
+_CHARACTER_ID = concept_registry.get_id('Character')
+
+
 @dataclass
 class Extractor:
     patterns: List[Pattern]
     hierarchy: Optional[HierarchyProvider] = None
     single_concepts: List[str] = field(default_factory=list)
+    # {concept: frozenset of all parents}, valid only for _parents_cache_hierarchy
+    _parents_cache: Dict[str, FrozenSet[str]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    _parents_cache_hierarchy: Optional[HierarchyProvider] = field(
+        default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         if self.hierarchy is None:
             self.hierarchy = DictHierarchyProvider(children={})
 
+    @staticmethod
+    def _get_character_values(
+            pattern: Pattern) -> Optional[Tuple[FrozenSet[str], List[str], bool]]:
+        """ Returns values of a Character if it is the only thing pattern matches,
+        such patterns can be matched without going through MatchState.
+        """
+        if pattern.pre or pattern.post or len(pattern.nodes) != 1:
+            return None
+        if pattern.id is not None or pattern.inside:
+            return None
+
+        node = pattern.nodes[0]
+        if node.concept != 'Character' or node.value is None:
+            return None
+        if node.optional or node.many or node.negate or not node.advance or \
+                node.at_start or node.at_end or node.assume is not None or node.id is not None:
+            return None
+
+        values = node.value
+        if not isinstance(values, list):
+            values = [values, ]
+        try:
+            return frozenset(values), values, node.negate_value
+        except TypeError:
+            return None
+
+    def _get_parents(self, concept: str) -> FrozenSet[str]:
+        if self._parents_cache_hierarchy is not self.hierarchy:
+            # hierarchy was replaced after the cache was filled
+            self._parents_cache.clear()
+            self._parents_cache_hierarchy = self.hierarchy
+        try:
+            return self._parents_cache[concept]
+        except KeyError:
+            parents = frozenset(self.hierarchy.get_parents(concept))
+            self._parents_cache[concept] = parents
+            return parents
+
     def apply_once(self, seq: DataSequence) -> bool:
         """ Applies a all patterns to a sequence ones
         and returns whether there were any new matches found
         """
         had_new_matches = False
+        # for every pattern: (value set, values, negate_value) if it matches a single Character,
+        # patterns can be changed between applies, so this is not kept on the extractor
+        character_values = [self._get_character_values(pattern) for pattern in self.patterns]
+        # concepts that patterns are required to be inside of
+        all_inside_concepts = frozenset(
+            pattern.inside for pattern in self.patterns if pattern.inside)
 
-        for start_idx in range(len(seq.elements)):
-            if seq.elements[start_idx].disabled:
+        for start_idx, element in enumerate(seq.elements):
+            if element.disabled:
                 continue
-            for pattern in self.patterns:
-                if pattern.inside and not \
-                        self.check_inside_start_idx(seq, start_idx, pattern.inside):
+
+            # `inside` concepts present in the element, patterns applied earlier
+            # may add new matches to it, so they are collected as we go
+            inside_concepts = set()
+            checked_matches = 0
+
+            for pattern_idx, pattern in enumerate(self.patterns):
+                if character_values[pattern_idx] is not None:
+                    for match in self._match_character(seq, start_idx, pattern,
+                                                       *character_values[pattern_idx]):
+                        had_new_matches |= seq.add_match(match)
                     continue
 
+                if pattern.inside:
+                    if checked_matches < len(element.matches):
+                        self._collect_inside_concepts(element.matches[checked_matches:],
+                                                      all_inside_concepts, inside_concepts)
+                        checked_matches = len(element.matches)
+                    if pattern.inside not in inside_concepts:
+                        continue
+
                 state = MatchState(
                     sequence_idx=start_idx,
                 )
@@ -52,19 +122,50 @@ class Extractor:
 
         return had_new_matches
 
+    def _match_character(self, seq: DataSequence, start_idx: int, pattern: Pattern,
+                         value_set: FrozenSet[str], values: List[str],
+                         negate_value: bool) -> List[Match]:
+        """ Same as pattern.match for patterns with a single Character node"""
+        matches = []
+        for other in seq.matches_by_start_idx.get(start_idx, ()):
+            if other.concept_id != _CHARACTER_ID and \
+                    'Character' not in self._get_parents(other.concept):
+                continue
+            try:
+                is_value_matching = other.value in value_set
+            except TypeError:
+                # unhashable value, compare it the way PatternNode does
+                is_value_matching = other.value in values
+            if is_value_matching == negate_value:
+                continue
+            matches.append(Match(
+                concept=pattern.concept,
+                value=seq.value[other.start_idx: other.end_idx],
+                size=other.size,
+                start_idx=other.start_idx,
+                depends_on_matches=frozenset((other.id, )),
+                weight=min(pattern.weight, other.weight),
+            ))
+        return matches
+
+    def _collect_inside_concepts(self, matches: List[Match], concepts: FrozenSet[str],
+                                 result: Set[str]):
+        for match in matches:
+            if match.concept in concepts:
+                result.add(match.concept)
+            result.update(concepts.intersection(self._get_parents(match.concept)))
+
     def check_inside_start_idx(self, seq, idx, inside_concept):
-        for match in seq.elements[idx].matches:
-            if inside_concept == match.concept or \
-                    inside_concept in self.hierarchy.get_parents(match.concept):
-                return True
-        return False
+        inside_concepts = set()
+        self._collect_inside_concepts(seq.elements[idx].matches, frozenset((inside_concept, )),
+                                      inside_concepts)
+        return inside_concept in inside_concepts
 
     def check_match_is_inside(self, seq, match, inside_concept):
-        for other in seq.elements[match.start_idx].matches:
-            if (inside_concept == other.concept or
-                inside_concept in self.hierarchy.get_parents(other.concept)) and \
-                    other.start_idx == match.start_idx and \
-                    other.size == match.size:
+        for other in seq.matches_by_start_idx.get(match.start_idx, ()):
+            if other.size == match.size and (
+                    inside_concept == other.concept or
+                    inside_concept in self._get_parents(other.concept)):
                 return True
         return False
 
@@ -1,12 +1,50 @@
 import copy
-import uuid
-from collections import defaultdict
+import itertools
 from dataclasses import dataclass, field
-from typing import List, Dict
+from typing import List, Dict, Tuple, FrozenSet, Optional
+
+
+# ids only need to be unique within the process, they are kept as strings
+# so that they can be sorted together with ids passed explicitly
+_MATCH_ID_COUNTER = itertools.count()
 
 
 def _get_match_id():
-    return str(uuid.uuid4())
+    return f"m{next(_MATCH_ID_COUNTER)}"
+
+
+class ConceptRegistry:
+    """ Assigns small integer ids to concepts,
+    comparing ids is cheaper than comparing concept strings.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._concepts: List[str] = []
+
+    def get_id(self, concept: str) -> int:
+        try:
+            return self._ids[concept]
+        except KeyError:
+            concept_id = len(self._concepts)
+            self._ids[concept] = concept_id
+            self._concepts.append(concept)
+            return concept_id
+
+    def get_concept(self, concept_id: int) -> str:
+        return self._concepts[concept_id]
+
+
+# shared by all sequences so that ids of matches from anywhere are comparable
+concept_registry = ConceptRegistry()
+
+
+def _shallow_clone(data: Dict[str, any]) -> Dict[str, any]:
+    """ Copies a dict and its list values, everything nested deeper is shared.
+    States only append to these lists, values inside them are never changed.
+    """
+    return {key: (list(value) if isinstance(value, list) else value)
+            for key, value in data.items()}
 
 
 @dataclass(slots=True)
@@ -23,14 +61,25 @@ class Match:
     # we want to deleted it if matches are invalidated.
     # this only contains direct dependencies, use get_all_dependencies
     # to get all of them
-    depends_on_matches: List[str] = field(default_factory=list)
-    extractions: Dict[str, List[str]] = field(default_factory=lambda: defaultdict(list), repr=False)
+    depends_on_matches: FrozenSet[str] = frozenset()
+    # None unless the match has extractions
+    extractions: Optional[Dict[str, List[str]]] = field(default=None, repr=False)
     structure: Dict[str, any] = field(default_factory=dict)
     weight: float = 1
-
-    @property
-    def end_idx(self):
-        return self.start_idx + self.size
+    # derived from concept, start_idx and size, matches are not changed after creation
+    concept_id: int = field(init=False, repr=False, compare=False)
+    end_idx: int = field(init=False, repr=False, compare=False)
+    slot: Tuple[int, int] = field(init=False, repr=False, compare=False)
+    # get_all_dependencies result, valid while sequence version is the same
+    _deps_cache: Optional[Tuple[str, ...]] = field(default=None, init=False, repr=False, compare=False)
+    _deps_cache_version: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not isinstance(self.depends_on_matches, frozenset):
+            self.depends_on_matches = frozenset(self.depends_on_matches)
+        self.concept_id = concept_registry.get_id(self.concept)
+        self.end_idx = self.start_idx + self.size
+        self.slot = self.start_idx, self.end_idx
 
     def __repr__(self):
         weight_str = ""
@@ -39,26 +88,27 @@ class Match:
         return f"<{self.concept} \"{self.value}\" [{self.size}]{weight_str}>"
 
     def dependencies_present(self, seq):
-        match_ids = seq.get_all_match_ids()
-        return not bool(set(self.depends_on_matches).difference(match_ids))
+        return self.depends_on_matches.issubset(seq.get_all_match_ids())
 
     def get_all_dependencies(self, seq):
         """ Returns recursive match ids that this match depends on"""
-        result = []
+        return list(self._get_all_dependencies(seq))
+
+    def _get_all_dependencies(self, seq) -> Tuple[str, ...]:
+        if self._deps_cache_version == seq.version:
+            return self._deps_cache
 
+        result = set(self.depends_on_matches)
         for dependency_id in self.depends_on_matches:
-            result.append(dependency_id)
             try:
                 dependency = seq.match_by_id[dependency_id]
             except KeyError:
                 continue
-            result.extend(dependency.get_all_dependencies(seq))
+            result.update(dependency._get_all_dependencies(seq))
 
-        return sorted(list(set(result)))
-
-    @property
-    def slot(self):
-        return self.start_idx, self.start_idx + self.size
+        self._deps_cache = tuple(sorted(result))
+        self._deps_cache_version = seq.version
+        return self._deps_cache
 
 
 @dataclass
@@ -85,12 +135,25 @@ class MatchState:
     sequence_end_idx: int = None
     many_optional: bool = False
     # {kb_node_id: [val1, val2]}
-    extractions: Dict[str, List[str]] = field(default_factory=lambda: defaultdict(list), repr=False)
+    extractions: Dict[str, List[str]] = field(default_factory=dict, repr=False)
     assumptions: List['MatchAssumption'] = field(default_factory=list, repr=False)
     depends_on_matches: List[str] = field(default_factory=list, repr=False)
     structure: Dict[str, any] = field(default_factory=dict, repr=False)
+    # extractions and structure are shared with the parent state after get_next
+    # and are copied only when this state has to change them
+    _owns_extractions: bool = field(default=True, init=False, repr=False, compare=False)
+    _owns_structure: bool = field(default=True, init=False, repr=False, compare=False)
+
+    def add_extraction(self, key, value):
+        if not self._owns_extractions:
+            self.extractions = _shallow_clone(self.extractions)
+            self._owns_extractions = True
+        self.extractions.setdefault(key, []).append(value)
 
     def add_data(self, key, value, many=False):
+        if not self._owns_structure:
+            self.structure = _shallow_clone(self.structure)
+            self._owns_structure = True
         if many:
             if key in self.structure:
                 # in case of two fields with the same id
@@ -112,17 +175,28 @@ class MatchState:
                  next_pattern: int = 1,
                  element_advancement: int = 1,
                  many_optional: bool = False) -> 'MatchState':
-        return MatchState(
+        state = MatchState(
             sequence_idx=self.sequence_idx + element_advancement,
             pattern_idx=self.pattern_idx + next_pattern,
             sequence_start_idx=self.sequence_start_idx,
             sequence_end_idx=self.sequence_end_idx,
             many_optional=many_optional,
-            extractions=copy.deepcopy(self.extractions),
+            extractions=self.extractions,
             assumptions=copy.copy(self.assumptions),
             depends_on_matches=copy.copy(self.depends_on_matches),
-            structure=copy.deepcopy(self.structure),
+            structure=self.structure,
         )
+        state._owns_extractions = False
+        state._owns_structure = False
+        # parent can't mutate shared data in place either
+        self._owns_extractions = False
+        self._owns_structure = False
+        return state
+
+    def copy(self) -> 'MatchState':
+        """ Same as copy.deepcopy, but extractions and structure are shared until changed"""
+        return self.get_next(next_pattern=0, element_advancement=0,
+                             many_optional=self.many_optional)
 
     def get_matches(self, seq, concept, weight):
         for match_id in self.depends_on_matches:
@@ -133,7 +207,7 @@ class MatchState:
         if self.structure:
             structure = {
                 "concept": concept,
-                "data": copy.deepcopy(self.structure),
+                "data": _shallow_clone(self.structure),
             }
 
         matches = []
@@ -143,8 +217,8 @@ class MatchState:
             size=self.sequence_end_idx - self.sequence_start_idx,
             start_idx=self.sequence_start_idx,
             assumed=False,
-            depends_on_matches=self.depends_on_matches.copy(),
-            extractions=copy.deepcopy(self.extractions),
+            depends_on_matches=frozenset(self.depends_on_matches),
+            extractions=_shallow_clone(self.extractions) if self.extractions else None,
             weight=weight,
             structure=structure
         )
@@ -157,7 +231,7 @@ class MatchState:
                 size=asmp.sequence_end_idx - asmp.sequence_start_idx,
                 start_idx=asmp.sequence_start_idx,
                 assumed=True,
-                depends_on_matches=[main_match.id, ],
+                depends_on_matches=frozenset((main_match.id, )),
                 weight=asmp.weight,
             ))
         return matches
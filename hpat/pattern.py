@@ -47,7 +47,7 @@ class PatternNode:
                         hierarchy: HierarchyProvider, origin: PatternNodeOrigin):
         next_states = []
 
-        original_state = copy.deepcopy(state)
+        original_state = state.copy()
 
         for match in matches:
             if match.start_idx != state.sequence_idx:
@@ -60,7 +60,7 @@ class PatternNode:
             if not is_matching:
                 continue
 
-            state = copy.deepcopy(original_state)
+            state = original_state.copy()
 
             element_advancement = match.size
             if not self.advance:
@@ -70,11 +70,11 @@ class PatternNode:
                 state.sequence_end_idx += element_advancement
 
             if self.id is not None:
-                state.extractions[self.id].append(match.value)
+                state.add_extraction(self.id, match.value)
             if self.assume is not None:
                 state.assumptions.append(MatchAssumption(
                     sequence_start_idx=match.start_idx,
-                    sequence_end_idx=match.start_idx + match.size,
+                    sequence_end_idx=match.end_idx,
                     assumed_concept=self.assume,
                     weight=self.assumption_weight,
                 ))
@@ -124,7 +124,7 @@ class PatternNode:
 
         if at_start and match.start_idx != 0:
             return False
-        if at_end and (match.start_idx + match.size) != len(seq.value):
+        if at_end and match.end_idx != len(seq.value):
             return False
 
         matching_concepts = {match.concept, }
@@ -181,7 +181,7 @@ class Pattern:
                 if self.is_state_completed(state):
                     if self.id:
                         value = seq.value[state.sequence_start_idx: state.sequence_end_idx]
-                        state.extractions[self.id].append(value)
+                        state.add_extraction(self.id, value)
                     matches.extend(state.get_matches(seq, self.concept, self.weight))
 
                 new_states.extend(self.get_next_states(seq, state, hierarchy))
@@ -192,13 +192,13 @@ class Pattern:
     def get_next_states(self, seq: DataSequence, state: MatchState,
                         hierarchy: HierarchyProvider) -> List[MatchState]:
         try:
-            matches: List[Match] = seq.elements[state.sequence_idx].matches
+            element = seq.elements[state.sequence_idx]
             # this line should go before the "disabled" check, so that
             # we don't return "new_state" if there is no next pattern node
             pattern_node, node_origin = self.get_node(state.pattern_idx)
 
-            if seq.elements[state.sequence_idx].disabled:
-                new_state = copy.deepcopy(state)
+            if element.disabled:
+                new_state = state.copy()
                 new_state.sequence_idx += 1
                 if new_state.sequence_end_idx is not None:
                     new_state.sequence_end_idx += 1
@@ -210,6 +210,8 @@ class Pattern:
             state.sequence_start_idx = state.sequence_idx
             state.sequence_end_idx = state.sequence_idx
 
+        # only matches starting at the element can continue the state
+        matches: List[Match] = seq.matches_by_start_idx.get(state.sequence_idx, ())
         return pattern_node.get_next_states(matches, seq, state, hierarchy, node_origin)
 
     def is_state_completed(self, state: MatchState) -> bool:
@@ -1,6 +1,11 @@
 from hpat import (
+    DataElement,
     DataSequence,
+    DictHierarchyProvider,
+    Extractor,
     Match,
+    Pattern,
+    PatternNode,
 )
 from hpat.match import (
     MatchAssumption,
@@ -59,6 +64,21 @@ def test_data_sequence_add_match_twice_different_start_idx():
     ]
 
 
+def test_data_sequence_add_match_duplicable_concept():
+    seq = DataSequence.from_string("a")
+    seq.add_match(Match("Apple", value="a", size=1, start_idx=0, id='1'))
+    seq.add_match(Match("Pear", value="a", size=1, start_idx=0, id='2'))
+    assert seq.add_match(Match("Sentence", value="a", size=1, start_idx=0,
+                               depends_on_matches=['1', ]))
+    assert seq.add_match(Match("Sentence", value="a", size=1, start_idx=0,
+                               depends_on_matches=['2', ]))
+    assert not seq.add_match(Match("Sentence", value="a", size=1, start_idx=0,
+                                   depends_on_matches=['2', ]))
+    assert seq.to_list() == [
+        [("Character", "a"), ("Sentence", "a"), ("Sentence", "a"), ("Apple", "a"), ("Pear", "a")],
+    ]
+
+
 def test_data_sequence_revoke_match():
     seq = DataSequence.from_string("a")
     seq.add_match(Match("Apple", value="a", size=1, start_idx=0, id='0'))
@@ -114,3 +134,160 @@ def test_data_sequence_get_matches_with_assumption():
     seq.revoke_match(main_match.id)
 
     assert seq.to_list() == [[("Character", "a"), ]]
+
+
+def test_data_sequence_get_dependant_matches():
+    seq = DataSequence.from_string("ab")
+    seq.add_match(Match("Apple1", value="a", size=1, start_idx=0, id='1'))
+    seq.add_match(Match("Apple2", value="ab", size=2, start_idx=0, id='2',
+                        depends_on_matches=['1', ]))
+    seq.add_match(Match("Apple3", value="b", size=1, start_idx=1, id='3',
+                        depends_on_matches=['2', ]))
+    seq.add_match(Match("Apple4", value="ab", size=2, start_idx=0, id='4',
+                        depends_on_matches=['2', '3', ]))
+
+    assert seq.find_dependant_matches('1') == ['2', ]
+    assert seq.find_dependant_matches('2') == ['3', '4', ]
+    assert seq.get_dependant_matches('1') == {'2', '3', '4', }
+    assert seq.get_match_importance('1') == 3
+    assert seq.get_match_importance('4') == 0
+
+    seq.revoke_match('3')
+
+    assert seq.get_dependant_matches('1') == {'2', }
+
+
+def _get_fruit_sequence():
+    seq = DataSequence.from_string("ab")
+    seq.add_match(Match("Pear", value="b", size=1, start_idx=1))
+    seq.add_match(Match("Apple", value="a", size=1, start_idx=0))
+    seq.add_match(Match("Apple", value="ab", size=2, start_idx=0))
+    return seq
+
+
+def test_data_sequence_get_slots():
+    seq = _get_fruit_sequence()
+    hierarchy = DictHierarchyProvider(parents={
+        "Apple": ["Fruit"],
+        "Pear": ["Fruit"],
+    })
+
+    assert seq.get_slots("Apple") == [(0, 1), (0, 2)]
+    assert seq.get_slots("Fruit") == []
+    assert seq.get_slots("Fruit", hierarchy) == [(0, 1), (0, 2), (1, 2)]
+
+
+def test_data_sequence_keep_only():
+    seq = _get_fruit_sequence()
+    seq.keep_only(["Fruit", ], hierarchy=DictHierarchyProvider(parents={"Pear": ["Fruit"]}))
+
+    assert seq.to_list() == [
+        [],
+        [("Pear", "b")],
+    ]
+
+
+def test_data_sequence_drop_matches():
+    seq = _get_fruit_sequence()
+    seq.drop_matches(["Fruit", ], hierarchy=DictHierarchyProvider(parents={"Pear": ["Fruit"]}))
+
+    assert seq.to_list() == [
+        [("Apple", "ab"), ("Character", "a"), ("Apple", "a")],
+        [("Apple", "ab"), ("Character", "b")],
+    ]
+    assert seq.get_slots("Pear") == []
+
+
+def test_match_get_all_dependencies():
+    seq = DataSequence.from_string("a")
+    seq.add_match(Match("Apple1", value="a", size=1, start_idx=0, id='1'))
+    seq.add_match(Match("Apple2", value="a", size=1, start_idx=0, id='2',
+                        depends_on_matches=['1', ]))
+    match = Match("Apple3", value="a", size=1, start_idx=0, id='3',
+                  depends_on_matches=['2', ])
+    seq.add_match(match)
+
+    assert match.get_all_dependencies(seq) == ['1', '2']
+
+    seq.revoke_match('2', cascade=False)
+
+    assert match.get_all_dependencies(seq) == ['2']
+
+
+def test_data_sequence_clean_matches():
+    seq = DataSequence.from_string("abc")
+    seq.add_match(Match("A", value="a", size=1, start_idx=0, id='a'))
+    seq.add_match(Match("B1", value="b", size=1, start_idx=1, id='b1'))
+    seq.add_match(Match("B2", value="b", size=1, start_idx=1, id='b2'))
+    seq.add_match(Match("AB", value="ab", size=2, start_idx=0, id='ab',
+                        depends_on_matches=['a', 'b1']))
+    seq.add_match(Match("BC", value="bc", size=2, start_idx=1, id='bc',
+                        depends_on_matches=['b2']))
+
+    seq.clean_matches('ab')
+
+    assert seq.to_list() == [
+        [("AB", "ab"), ("Character", "a"), ("A", "a")],
+        [("AB", "ab"), ("Character", "b"), ("B1", "b")],
+        [("Character", "c")],
+    ]
+
+
+def test_data_sequence_explicit_and_generated_ids():
+    seq = DataSequence.from_string("ab")
+    seq.add_match(Match("A", value="a", size=1, start_idx=0, id='x'))
+    extractor = Extractor([
+        Pattern("AB", [PatternNode("A"), PatternNode("Character")]),
+    ])
+    extractor.apply(seq)
+
+    ab = seq.match_by_id[seq.find_dependant_matches('x')[0]]
+    character = seq.elements[1].matches[0]
+
+    assert ab.concept == 'AB'
+    assert ab.get_all_dependencies(seq) == sorted(['x', character.id])
+
+    seq.add_match(Match("B", value="b", size=1, start_idx=1, id='y',
+                        depends_on_matches=[character.id, ]))
+    assert seq.find_dependant_matches(character.id) == sorted([ab.id, 'y'])
+
+    seq.clean_matches(ab.id)
+
+    assert seq.to_list() == [
+        [("AB", "ab"), ("Character", "a"), ("A", "a")],
+        [("AB", "ab"), ("Character", "b")],
+    ]
+
+
+def test_data_sequence_revoke_match_cleans_dependents():
+    seq = DataSequence.from_string("a")
+    character_id = seq.elements[0].matches[0].id
+    seq.add_match(Match("Apple1", value="a", size=1, start_idx=0, id='1',
+                        depends_on_matches=[character_id, ]))
+    seq.add_match(Match("Apple2", value="a", size=1, start_idx=0, id='2',
+                        depends_on_matches=['1', ]))
+    seq.add_match(Match("Apple3", value="a", size=1, start_idx=0, id='3',
+                        depends_on_matches=['2', ]))
+
+    seq.revoke_match('2', cascade=False)
+
+    # '2' is gone, but revoking it again must still reach '3'
+    assert dict(seq.dependents_by_id) == {character_id: {'1'}, '2': {'3'}}
+
+    seq.revoke_match('1')
+
+    assert dict(seq.dependents_by_id) == {'2': {'3'}}
+
+    seq.revoke_match('2')
+
+    assert dict(seq.dependents_by_id) == {}
+    assert seq.to_list() == [[("Character", "a")]]
+
+
+def test_data_sequence_equality_ignores_indexes():
+    def make_seq():
+        return DataSequence("a", [
+            DataElement("a", [Match("Character", "a", 1, 0, id="c0")]),
+        ])
+
+    assert make_seq() == make_seq()
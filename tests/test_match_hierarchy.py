@@ -2,6 +2,7 @@ from hpat import (
     DataSequence,
     Extractor,
     DictHierarchyProvider,
+    Match,
     PatternNode,
     Pattern,
 )
@@ -31,3 +32,84 @@ def test_dict_hierarchy_provider():
         [('MathOp', '1+1'), ('Character', '+'), ('Plus', '+')],
         [('MathOp', '1+1'), ('Character', '1'), ('Digit', '1')],
     ]
+
+
+def test_character_pattern_matches_child_concept():
+    seq = DataSequence.from_string("1")
+    seq.add_match(Match("Glyph", value="one", size=1, start_idx=0))
+
+    extractor = Extractor([
+        Pattern("Digit", [PatternNode("Character", "one")]),
+    ], hierarchy=DictHierarchyProvider(parents={
+        "Glyph": ["Character"],
+    }))
+
+    extractor.apply(seq)
+
+    assert seq.to_list() == [
+        [('Character', '1'), ('Glyph', 'one'), ('Digit', '1')],
+    ]
+
+
+def test_character_pattern_matches_child_concept_unhashable_value():
+    seq = DataSequence.from_string("1")
+    seq.add_match(Match("Glyph", value=["x"], size=1, start_idx=0))
+
+    extractor = Extractor([
+        Pattern("Digit", [PatternNode("Character", "1")]),
+        Pattern("Other", [PatternNode("Character", "1", negate_value=True)]),
+    ], hierarchy=DictHierarchyProvider(parents={
+        "Glyph": ["Character"],
+    }))
+
+    extractor.apply(seq)
+
+    assert seq.to_list() == [
+        [('Character', '1'), ('Glyph', ['x']), ('Digit', '1'), ('Other', '1')],
+    ]
+
+
+def test_inside_pattern_added_after_extractor_creation():
+    seq = DataSequence.from_string("11")
+
+    extractor = Extractor([
+        Pattern("Digit", [PatternNode("Character", "1")]),
+        Pattern("Number", [PatternNode("Digit", many=True)]),
+    ])
+    extractor.patterns.append(
+        Pattern("One", [PatternNode("Digit")], inside="Number"))
+
+    extractor.apply(seq)
+
+    assert [concept for concept, _ in seq.to_list()[0]].count('One') == 1
+
+
+def test_hierarchy_replaced_after_extractor_creation():
+    extractor = Extractor([
+        Pattern("Noun", [PatternNode("Character", "a")]),
+        Pattern("Small", [PatternNode("Noun")], inside="Word"),
+    ], hierarchy=DictHierarchyProvider(parents={"Noun": ["Thing"]}))
+
+    seq = DataSequence.from_string("a")
+    extractor.apply(seq)
+    assert seq.to_list() == [
+        [('Character', 'a'), ('Noun', 'a')],
+    ]
+
+    extractor.hierarchy = DictHierarchyProvider(parents={"Noun": ["Word"]})
+    seq = DataSequence.from_string("a")
+    extractor.apply(seq)
+    assert seq.to_list() == [
+        [('Character', 'a'), ('Small', 'a'), ('Noun', 'a')],
+    ]
+
+
+def test_check_inside_start_idx():
+    extractor = Extractor([], hierarchy=DictHierarchyProvider(parents={"Noun": ["Word"]}))
+    seq = DataSequence.from_string("ab")
+    seq.add_match(Match("Noun", value="a", size=1, start_idx=0))
+
+    assert extractor.check_inside_start_idx(seq, 0, "Noun")
+    assert extractor.check_inside_start_idx(seq, 0, "Word")
+    assert not extractor.check_inside_start_idx(seq, 0, "Verb")
+    assert not extractor.check_inside_start_idx(seq, 1, "Word")
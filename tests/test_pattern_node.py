@@ -61,3 +61,22 @@ def test_pattern_node_multiple_value():
 
     match = Match("Character", "6", 1, 0)
     assert node.is_matching(match, None, MatchState()) is False
+
+
+def test_match_state_get_next_does_not_share_changes():
+    state = MatchState()
+    state.add_data("key", "a", many=True)
+    state.add_extraction("node", "a")
+
+    first = state.get_next()
+    second = state.get_next()
+    first.add_data("key", "b", many=True)
+    first.add_extraction("node", "b")
+    second.add_data("other", "c")
+
+    assert state.structure == {"key": ["a"]}
+    assert state.extractions == {"node": ["a"]}
+    assert first.structure == {"key": ["a", "b"]}
+    assert first.extractions == {"node": ["a", "b"]}
+    assert second.structure == {"key": ["a"], "other": "c"}
+    assert second.extractions == {"node": ["a"]}
@@ -321,3 +321,18 @@ def test_negative_pattern_dont_advance():
         [('Character', '2'), ('Digit', '2'), ('Test', '2')],
         [('Character', '2'), ('Digit', '2'), ('Test', '2')],
     ]
+
+
+def test_patterns_added_after_extractor_creation():
+    seq = DataSequence.from_string("1+")
+    extractor = Extractor([
+        Pattern("Digit", [PatternNode("Character", "1")]),
+    ])
+    extractor.patterns.append(Pattern("Plus", [PatternNode("Character", "+")]))
+
+    extractor.apply(seq)
+
+    assert seq.to_list() == [
+        [('Character', '1'), ('Digit', '1')],
+        [('Character', '+'), ('Plus', '+')],
+    ]